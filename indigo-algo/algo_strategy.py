@@ -18,8 +18,66 @@ Advanced strategy tips:
   the actual current map state.
 """
 
+# Static build locations. These never change between turns, so they are built once at import
+# instead of on every call to the build_* methods, as tuples, which attempt_spawn accepts for firewalls.
+
+# Columns left open in the destructor rows, packed as a bitmask so column x is excluded when (_EXCLUDED_MASK >> x) & 1
+_EXCLUDED_MASK = (1 << 3) | (1 << 6) | (1 << 10) | (1 << 12) | (1 << 15) | (1 << 17) | (1 << 21) | (1 << 24)
+
+_DEFENSE_ROW13 = tuple((x, 13) for x in range(28) if not (_EXCLUDED_MASK >> x) & 1)
+# Each column is paired with its mirror, so only the left half needs iterating
+_ADDL_DEF = tuple(location for i in range(1, 14) if not (_EXCLUDED_MASK >> i) & 1
+                  for location in ((i, 12), (27 - i, 12)))
+_DEF3 = tuple(location for i in range(2, 14) if not (_EXCLUDED_MASK >> i) & 1
+              for location in ((i, 11), (27 - i, 11)))
+
+_TUNNEL = ((5, 11), (6, 10), (7, 9), (8, 8), (9, 7), (10, 6), (11, 5), (12, 4),
+           (14, 3), (15, 4), (16, 5), (17, 6), (18, 7), (19, 8))
+# Both funnels share the diagonal ramp down to the centre, they only differ in which side is left open
+_LEFT_RAMP = ((7, 8), (8, 7), (9, 6), (10, 5), (11, 4), (12, 3))
+_RIGHT_RAMP = ((14, 2), (15, 3), (16, 4), (17, 5), (18, 6), (19, 7))
+_RAMP = _LEFT_RAMP + _RIGHT_RAMP
+_RIGHT_FUNNEL = ((3, 11), (4, 11), (5, 10), (6, 9)) + _LEFT_RAMP + ((13, 2),) + _RIGHT_RAMP + ((20, 8),)
+_LEFT_FUNNEL = ((24, 11), (23, 11), (22, 10), (21, 9), (20, 8)) + _RAMP[::-1]
+_EMP_LINE = tuple((x, 11) for x in range(27, 5, -1))
+
+# Information units have to be spawned on an edge, and GameState only matches edge locations given as lists
+_SCRAMBLER_DEPLOY = ([9, 4], [18, 4])
+
+# Plies searched when committing to a funnel direction, and enemy responses considered per ply
+_SEARCH_DEPTH = 2
+_SEARCH_RESPONSES = 3
+
+
+def _score_path(path, attacker_grid):
+    """
+    Total number of destructor hits a unit takes walking the given path, using an attacker grid indexed [x][y].
+    """
+    hits = 0
+    for x, y in path:
+        hits += attacker_grid[x][y]
+    return hits
+
+
+def _count_units(units, unit_type, valid_x, valid_y):
+    """
+    Number of (x, y, unit_type) entries in units matching the filters, where a filter of None matches anything.
+    """
+    count = 0
+    for x, y, other_type in units:
+        if ((unit_type is None or other_type == unit_type) and
+                (valid_x is None or x in valid_x) and (valid_y is None or y in valid_y)):
+            count += 1
+    return count
+
 
 class AlgoStrategy(gamelib.AlgoCore):
+    # AlgoCore doesn't define __slots__, so instances keep a __dict__, but the attributes
+    # read every turn are stored in fixed slots instead. New state should be added here too.
+    __slots__ = ('config', 'scored_on_locations', '_seen_breaches', 'funnel_left', 'best_location',
+                 '_turn_handler', '_build_funnel', '_destructor_damage', '_cheapest_stationary',
+                 '_destructor_range', '_enemy_units', '_attacker_grid', '_enemy_units_state')
+
     def __init__(self):
         super().__init__()
         seed = random.randrange(maxsize)
@@ -32,16 +90,33 @@ class AlgoStrategy(gamelib.AlgoCore):
         """
         gamelib.debug_write('Configuring your custom algo strategy...')
         self.config = config
+        unit_information = config["unitInformation"]
         global FILTER, ENCRYPTOR, DESTRUCTOR, PING, EMP, SCRAMBLER
-        FILTER = config["unitInformation"][0]["shorthand"]
-        ENCRYPTOR = config["unitInformation"][1]["shorthand"]
-        DESTRUCTOR = config["unitInformation"][2]["shorthand"]
-        PING = config["unitInformation"][3]["shorthand"]
-        EMP = config["unitInformation"][4]["shorthand"]
-        SCRAMBLER = config["unitInformation"][5]["shorthand"]
+        FILTER = unit_information[0]["shorthand"]
+        ENCRYPTOR = unit_information[1]["shorthand"]
+        DESTRUCTOR = unit_information[2]["shorthand"]
+        PING = unit_information[3]["shorthand"]
+        EMP = unit_information[4]["shorthand"]
+        SCRAMBLER = unit_information[5]["shorthand"]
+        # Unit stats are fixed for the whole game, so read them straight from the config once.
+        # GameUnit can't be used here since gamelib only registers unit types once a GameState exists.
+        self._destructor_damage = unit_information[2]["damage"]
+        self._destructor_range = unit_information[2]["range"]
+        # Cheapest stationary unit, preferring FILTER, then DESTRUCTOR, then ENCRYPTOR on ties
+        self._cheapest_stationary = unit_information[min((0, 2, 1), key=lambda i: unit_information[i]["cost"])]["shorthand"]
+        # Enemy units on the board as (x, y, unit_type), and the number of enemy destructors
+        # that can attack each location, along with the game state they were read from
+        self._enemy_units = ()
+        self._attacker_grid = None
+        self._enemy_units_state = None
         # This is a good place to do initial setup
         self.scored_on_locations = []
+        # Breach locations already in scored_on_locations, so each is only recorded once
+        self._seen_breaches = set()
         self.funnel_left = True
+        # What funnel_strategy does after the basic defenses, swapped to _funnel_turns once we commit to a funnel
+        self._turn_handler = self._early_turns
+        self._build_funnel = self.build_left_funnel
 
     def on_turn(self, turn_state):
         """
@@ -70,39 +145,37 @@ class AlgoStrategy(gamelib.AlgoCore):
         # Now build reactive defenses based on where the enemy scored
         self.build_reactive_defense(game_state)
 
+        # The rest depends on whether we have committed to a funnel yet
+        self._turn_handler(game_state)
+
+    def _early_turns(self, game_state):
         # If the turn is less than 3, stall with Scramblers and wait to see enemy's base
         if game_state.turn_number < 3:
             self.stall_with_scramblers(game_state)
-        else:
-            # On turn 3, check which direction to funnel towards, and commit to it
-            if game_state.turn_number == 3:
-                ping_spawn_location_options = [[3, 10], [24, 10]]
-                self.best_location = self.least_damage_spawn_location(game_state, ping_spawn_location_options)
-                if self.best_location == [2, 11]:
-                    self.build_left_funnel(game_state)
-                    self.funnel_left = True
-                else:
-                    self.build_right_funnel(game_state)
-                    self.funnel_left = False
-
-            # On all turns after turn 3..
-            elif game_state.turn_number > 3:
-                # Keep committing to the funnel...
-                if self.funnel_left:
-                    self.build_left_funnel(game_state)
-                else:
-                    self.build_right_funnel(game_state)
-
-                # Fortify defenses w/ our additional cores
-                self.build_additional_defenses(game_state)
-                self.build_better_tunnel(game_state)
-                self.build_defenses3(game_state)
-                # self.build_center(game_state)
-
-                # And swarm down the funnel with units if we have enough bits
-                if game_state.get_resource(game_state.BITS) >= 10:
-                    game_state.attempt_spawn(PING, self.best_location, 1000)
-
+            return
+
+        # On turn 3, check which direction to funnel towards, and commit to it
+        ping_spawn_location_options = [[3, 10], [24, 10]]
+        self.best_location = self.funnel_spawn_location(game_state, ping_spawn_location_options)
+        self.funnel_left = self.best_location == [2, 11]
+        self._build_funnel = self.build_left_funnel if self.funnel_left else self.build_right_funnel
+        self._build_funnel(game_state)
+        # All turns after this one go straight to _funnel_turns
+        self._turn_handler = self._funnel_turns
+
+    def _funnel_turns(self, game_state):
+        # Keep committing to the funnel...
+        self._build_funnel(game_state)
+
+        # Fortify defenses w/ our additional cores
+        self.build_additional_defenses(game_state)
+        self.build_better_tunnel(game_state)
+        self.build_defenses3(game_state)
+        # self.build_center(game_state)
+
+        # And swarm down the funnel with units if we have enough bits
+        if game_state.get_resource(game_state.BITS) >= 10:
+            game_state.attempt_spawn(PING, self.best_location, 1000)
 
     def build_defenses(self, game_state):
         """
@@ -113,16 +186,15 @@ class AlgoStrategy(gamelib.AlgoCore):
         # More community tools available at: https://terminal.c1games.com/rules#Download
 
         # Place initial units
-        destructor_locations = [[x, 13] for x in range(28) if x not in [3, 6, 10, 12, 15, 17, 21, 24]]
-
         # attempt_spawn will try to spawn units if we have resources, and will check if a blocking unit is already there
-        game_state.attempt_spawn(DESTRUCTOR, destructor_locations)
+        game_state.attempt_spawn(DESTRUCTOR, _DEFENSE_ROW13)
 
     def build_reactive_defense(self, game_state):
         """
         This function builds reactive defenses based on where the enemy scored on us from.
         We can track where the opponent scored by looking at events in action frames 
-        as shown in the on_action_frame function
+        as shown in the on_action_frame function.
+        scored_on_locations holds each breach location once, so this is linear in distinct breaches.
         """
         for location in self.scored_on_locations:
             # Build destructor one space above so that it doesn't block our own edge spawn locations
@@ -130,108 +202,41 @@ class AlgoStrategy(gamelib.AlgoCore):
             game_state.attempt_spawn(DESTRUCTOR, build_location)
 
     def build_additional_defenses(self, game_state):
-        destructor_locations = []
-        for i in range(1, 27):
-            if i not in [3, 6, 10, 12, 15, 17, 21, 24]:
-                destructor_locations.extend([[i, 12], [27-i, 12]])
-        game_state.attempt_spawn(DESTRUCTOR, destructor_locations)
+        game_state.attempt_spawn(DESTRUCTOR, _ADDL_DEF)
 
     def build_better_tunnel(self, game_state):
-        el = [[5, 11], [6, 10], [7, 9], [8, 8], [9, 7], [10, 6], [11, 5], [12, 4],
-              [14, 3], [15, 4], [16, 5], [17, 6], [18, 7], [19, 8]]
-
-        game_state.attempt_spawn(ENCRYPTOR, el)
+        game_state.attempt_spawn(ENCRYPTOR, _TUNNEL)
 
     def build_defenses3(self, game_state):
-        destructor_locations = []
-        for i in range(2, 26):
-            if i not in [3, 6, 10, 12, 15, 17, 21, 24]:
-                destructor_locations.extend([[i, 11], [27-i, 11]])
-        game_state.attempt_spawn(DESTRUCTOR, destructor_locations)
-
-
-    def build_additional_defenses(self, game_state):
-        destructor_locations = []
-        for i in range(1, 13):
-            if i not in [3, 6, 10, 12, 15, 17, 21, 24]:
-                destructor_locations.extend([[i, 12], [27-i, 12]])
-        game_state.attempt_spawn(DESTRUCTOR, destructor_locations)
-
-
-
-
-    def emp_line_strategy(self, game_state):
-        """
-        Build a line of the cheapest stationary unit so our EMP's can attack from long range.
-        """
-        # First let's figure out the cheapest unit
-        # We could just check the game rules, but this demonstrates how to use the GameUnit class
-        stationary_units = [FILTER, DESTRUCTOR, ENCRYPTOR]
-        cheapest_unit = FILTER
-        for unit in stationary_units:
-            unit_class = gamelib.GameUnit(unit, game_state.config)
-            if unit_class.cost < gamelib.GameUnit(cheapest_unit, game_state.config).cost:
-                cheapest_unit = unit
-
-        # Now let's build out a line of stationary units. This will prevent our EMPs from running into the enemy base.
-        # Instead they will stay at the perfect distance to attack the front two rows of the enemy base.
-        for x in range(27, 5, -1):
-            game_state.attempt_spawn(cheapest_unit, [x, 11])
-
-        # Now spawn EMPs next to the line
-        # By asking attempt_spawn to spawn 1000 units, it will essentially spawn as many as we have resources for
-        game_state.attempt_spawn(EMP, [24, 10], 2)
-
+        game_state.attempt_spawn(DESTRUCTOR, _DEF3)
 
     def build_right_funnel(self, game_state):
-        enc_locations =[[3, 11], [4, 11], [5, 10], [6, 9], [7, 8], [8,7], [9, 6], [10, 5], [11, 4],
-                        [12, 3], [13, 2], [14, 2], [15, 3], [16, 4], [17, 5], [18, 6], [19, 7],
-                        [20, 8]]
-        game_state.attempt_spawn(ENCRYPTOR, enc_locations)
+        game_state.attempt_spawn(ENCRYPTOR, _RIGHT_FUNNEL)
 
     def build_left_funnel(self, game_state):
-        enc_locations = [[24, 11], [23, 11], [22, 10], [21, 9], [20, 8], [19, 7], [18, 6], [17, 5],
-                         [16, 4], [15, 3], [14, 2], [12, 3], [11, 4], [10, 5], [9, 6], [8, 7], [7, 8]]
-        game_state.attempt_spawn(ENCRYPTOR, enc_locations)
+        game_state.attempt_spawn(ENCRYPTOR, _LEFT_FUNNEL)
 
     def stall_with_scramblers(self, game_state):
         """
         Send out Scramblers at random locations to defend our base from enemy moving units.
         """
-        deploy_locations = [[9, 4], [18, 4]]
-
         # Randomly spawn up to quarter scramblers
-        count = 0
         quarter = game_state.get_resource(game_state.BITS) // 4 + 1
-        while count < quarter and len(deploy_locations) > 0:
+        for _ in range(int(quarter)):
             # Choose a random deploy location.
-            deploy_index = random.randint(0, len(deploy_locations) - 1)
-            deploy_location = deploy_locations[deploy_index]
-
-            game_state.attempt_spawn(SCRAMBLER, deploy_location)
-            count += 1
-            """
-            We don't have to remove the location since multiple information 
-            units can occupy the same space.
-            """
+            # We don't have to remove the location since multiple information units can occupy the same space.
+            game_state.attempt_spawn(SCRAMBLER, random.choice(_SCRAMBLER_DEPLOY))
 
     def emp_line_strategy(self, game_state):
         """
         Build a line of the cheapest stationary unit so our EMP's can attack from long range.
         """
-        # First let's figure out the cheapest unit
-        # We could just check the game rules, but this demonstrates how to use the GameUnit class
-        stationary_units = [FILTER, DESTRUCTOR, ENCRYPTOR]
-        cheapest_unit = FILTER
-        for unit in stationary_units:
-            unit_class = gamelib.GameUnit(unit, game_state.config)
-            if unit_class.cost < gamelib.GameUnit(cheapest_unit, game_state.config).cost:
-                cheapest_unit = unit
+        # The cheapest unit is looked up from the game rules once in on_game_start
+        cheapest_unit = self._cheapest_stationary
 
         # Now let's build out a line of stationary units. This will prevent our EMPs from running into the enemy base.
         # Instead they will stay at the perfect distance to attack the front two rows of the enemy base.
-        for x in range(27, 5, -1):
-            game_state.attempt_spawn(cheapest_unit, [x, 11])
+        game_state.attempt_spawn(cheapest_unit, _EMP_LINE)
 
         # Now spawn EMPs next to the line
         # By asking attempt_spawn to spawn 1000 units, it will essentially spawn as many as we have resources for
@@ -243,36 +248,140 @@ class AlgoStrategy(gamelib.AlgoCore):
         It gets the path the unit will take then checks locations on that path to
         estimate the path's damage risk.
         """
+        if game_state is not self._enemy_units_state:
+            self.index_enemy_units(game_state)
         damages = []
+        attacker_grid = self._attacker_grid
+        destructor_damage = self._destructor_damage
         # Get the damage estimate each path will take
         for location in location_options:
             path = game_state.find_path_to_edge(location)
-            damage = 0
-            for path_location in path:
-                # Get number of enemy destructors that can attack the final location and multiply by destructor damage
-                damage += len(game_state.get_attackers(path_location, 0)) * gamelib.GameUnit(DESTRUCTOR,
-                                                                                             game_state.config).damage
-            damages.append(damage)
+            # Count the enemy destructors that can attack each location on the path, then multiply by destructor damage once
+            damages.append(_score_path(path, attacker_grid) * destructor_damage)
 
-        # Now just return the location that takes the least damage
-        return location_options[damages.index(min(damages))]
+        # Now just return the location that takes the least damage, the first one on ties
+        return location_options[min(range(len(damages)), key=damages.__getitem__)]
 
-    def detect_enemy_unit(self, game_state, unit_type=None, valid_x=None, valid_y=None):
-        total_units = 0
-        for location in game_state.game_map:
+    def funnel_spawn_location(self, game_state, location_options, depth=_SEARCH_DEPTH):
+        """
+        Like least_damage_spawn_location, but looks ahead with a shallow alpha-beta search.
+        We pick a spawn location, then the enemy answers with one more destructor, alternating until depth runs out.
+        Leaves are scored by how many destructor hits our units take along the chosen path.
+
+        Enemy responses are limited to empty locations on their side that aren't on any candidate path,
+        so the paths never change and every leaf can be scored from the attacker grid without pathfinding.
+        """
+        if game_state is not self._enemy_units_state:
+            self.index_enemy_units(game_state)
+        attacker_grid = self._attacker_grid
+        paths = [game_state.find_path_to_edge(location) for location in location_options]
+        on_paths = {(x, y) for path in paths for x, y in path}
+
+        # For each path, the extra hits every possible enemy destructor would add to it
+        game_map = game_state.game_map
+        path_gains = [{} for _ in paths]
+        for location in game_map:
+            x, y = location
+            if y < game_map.HALF_ARENA or (x, y) in on_paths or game_map[location]:
+                continue
+            footprint = set(self.destructor_footprint(game_map, x, y))
+            for path, gains in zip(paths, path_gains):
+                gain = sum(1 for path_location in path if tuple(path_location) in footprint)
+                if gain:
+                    gains[x, y] = gain
+
+        # Only the strongest few responses per path are searched, best first so pruning kicks in early
+        path_nodes = []
+        for path, gains in zip(paths, path_gains):
+            responses = sorted(gains, key=gains.__getitem__, reverse=True)[:_SEARCH_RESPONSES]
+            path_nodes.append((_score_path(path, attacker_grid), gains, responses))
+
+        best_index = 0
+        alpha = -math.inf
+        for index in range(len(path_nodes)):
+            value = self._minimax(path_nodes, index, (), depth - 1, alpha, math.inf, False)
+            if value > alpha:
+                best_index, alpha = index, value
+        return location_options[best_index]
+
+    def _minimax(self, path_nodes, path_index, responses, depth, alpha, beta, maximizing):
+        """
+        Alpha-beta search over our spawn choice (maximizing) and enemy destructor responses (minimizing).
+        Values are the negated number of destructor hits along the current path.
+        """
+        attacker_count, gains, candidates = path_nodes[path_index]
+        candidates = [response for response in candidates if response not in responses]
+        if depth == 0 or (not maximizing and not candidates):
+            return -(attacker_count + sum(gains.get(response, 0) for response in responses))
+
+        if maximizing:
+            value = -math.inf
+            for index in range(len(path_nodes)):
+                value = max(value, self._minimax(path_nodes, index, responses, depth - 1, alpha, beta, False))
+                alpha = max(alpha, value)
+                if alpha >= beta:
+                    break
+            return value
+
+        value = math.inf
+        for response in candidates:
+            value = min(value, self._minimax(path_nodes, path_index, responses + (response,), depth - 1,
+                                             alpha, beta, True))
+            beta = min(beta, value)
+            if alpha >= beta:
+                break
+        return value
+
+    def index_enemy_units(self, game_state):
+        """
+        Scan the map once and record every enemy unit on a blocked location, so
+        detect_enemy_unit can filter this list instead of walking the whole map.
+        Also counts how many enemy destructors can attack each location, which is
+        what game_state.get_attackers would return the length of for our units.
+        Callers run this lazily, the first time they see a new game state.
+        """
+        game_map = game_state.game_map
+        enemy_units = []
+        for location in game_map:
             if game_state.contains_stationary_unit(location):
-                for unit in game_state.game_map[location]:
-                    if unit.player_index == 1 and (unit_type is None or unit.unit_type == unit_type) and (
-                            valid_x is None or location[0] in valid_x) and (valid_y is None or location[1] in valid_y):
-                        total_units += 1
-        return total_units
+                for unit in game_map[location]:
+                    if unit.player_index == 1:
+                        enemy_units.append((location[0], location[1], unit.unit_type))
+
+        # Our own spawns never change the enemy destructors, so this stays valid for the whole turn
+        attacker_grid = [[0] * game_map.ARENA_SIZE for _ in range(game_map.ARENA_SIZE)]
+        for x, y, unit_type in enemy_units:
+            if unit_type == DESTRUCTOR:
+                for target_x, target_y in self.destructor_footprint(game_map, x, y):
+                    attacker_grid[target_x][target_y] += 1
+        self._enemy_units = enemy_units
+        self._attacker_grid = attacker_grid
+        self._enemy_units_state = game_state
+
+    def destructor_footprint(self, game_map, x, y):
+        """
+        Returns the locations a destructor at [x, y] can attack, matching what game_state.get_attackers reports.
+        """
+        radius = self._destructor_range
+        reach = int(radius) + 1
+        footprint = []
+        for target_x in range(x - reach, x + reach + 1):
+            for target_y in range(y - reach, y + reach + 1):
+                # Same bounds and distance test get_locations_in_range applies when searching from the target
+                if (int(target_x - radius) <= x < int(target_x + radius + 1) and
+                        int(target_y - radius) <= y < int(target_y + radius + 1) and
+                        game_map.in_arena_bounds([target_x, target_y]) and
+                        game_map.distance_between_locations([x, y], [target_x, target_y]) < radius + 0.51):
+                    footprint.append((target_x, target_y))
+        return footprint
+
+    def detect_enemy_unit(self, game_state, unit_type=None, valid_x=None, valid_y=None):
+        if game_state is not self._enemy_units_state:
+            self.index_enemy_units(game_state)
+        return _count_units(self._enemy_units, unit_type, valid_x, valid_y)
 
     def filter_blocked_locations(self, locations, game_state):
-        filtered = []
-        for location in locations:
-            if not game_state.contains_stationary_unit(location):
-                filtered.append(location)
-        return filtered
+        return [location for location in locations if not game_state.contains_stationary_unit(location)]
 
     def on_action_frame(self, turn_string):
         """
@@ -281,6 +390,9 @@ class AlgoStrategy(gamelib.AlgoCore):
         Processing the action frames is complicated so we only suggest it if you have time and experience.
         Full doc on format of a game frame at: https://docs.c1games.com/json-docs.html
         """
+        # Most frames have no breaches, so skip parsing the whole frame when the breach list is empty
+        if '"breach":[]' in turn_string:
+            return
         # Let's record at what position we get scored on
         state = json.loads(turn_string)
         events = state["events"]
@@ -292,7 +404,11 @@ class AlgoStrategy(gamelib.AlgoCore):
             # 1 is integer for yourself, 2 is opponent (StarterKit code uses 0, 1 as player_index instead)
             if not unit_owner_self:
                 gamelib.debug_write("Got scored on at: {}".format(location))
-                self.scored_on_locations.append(location)
+                # Repeat breaches at the same spot would just rebuild the same destructor
+                breach_location = (location[0], location[1])
+                if breach_location not in self._seen_breaches:
+                    self._seen_breaches.add(breach_location)
+                    self.scored_on_locations.append(location)
                 gamelib.debug_write("All locations: {}".format(self.scored_on_locations))
 
 